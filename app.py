@@ -1,31 +1,430 @@
 from __future__ import annotations
 
-import json
+import hashlib
+import logging
+import re
+import tempfile
+import threading
+from bisect import bisect_right
+from collections import OrderedDict
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import AbstractSet, Any, Callable, Dict, FrozenSet, Iterator, List, Sequence, Set, Tuple, Union
 
-from flask import Flask, jsonify, render_template, request
+import msgspec
+from flask import Flask, Response, request, stream_template
+from jinja2 import FileSystemBytecodeCache
 
 
+log = logging.getLogger(__name__)
+
 BASE_DIR = Path(__file__).parent
 DATA_FILE = BASE_DIR / "data" / "inventory.json"
+JINJA_CACHE_DIR = BASE_DIR / ".jinja_cache"
+
+# Cache do inventário: só relê o JSON quando o mtime do arquivo muda
+_CACHE: Dict[str, Any] = {"mtime": None, "data": None}
+_CACHE_LOCK = threading.Lock()
+
+_TOKEN_SPLIT = re.compile(r"\W+")
+_WORD = re.compile(r"\w+")
+_POSTINGS_CACHE_SIZE = 256
+# palavra "comum": listas de postagem somam mais que 1/32 dos itens
+_BROAD_WORD_FRACTION = 32
+# separador dos tokens do vocabulário concatenados para a varredura em bloco
+_SCAN_SEP = "\x01"
+
+# Layout SVG: espaço entre células e margem externa (px)
+SVG_SPACING = 8
+SVG_MARGIN = 16
+
+# Cor do marcador por quantidade: índice = min(qty, 31)
+QTY_COLOR: Tuple[str, ...] = (
+    ("#ef4444",) * 11    # vermelho: até 10
+    + ("#f59e0b",) * 20  # amarelo: 11 a 30
+    + ("#22c55e",)       # verde: acima de 30
+)
+
+
+# Campos de texto aceitam também números/null (ex.: "sku": 123); use str() ao ler
+Text = Union[str, int, float, bool, None]
+# x/y/qty no arquivo: qualquer valor que int() aceite (3, "3", 1.5, true)
+Number = Union[int, float, bool, str, None, msgspec.UnsetType]
+
+
+class _ItemText(msgspec.Struct, frozen=True):
+    sku: Text = ""
+    name: Text = ""
+    category: Text = ""
+    description: Text = ""
+    aisle: Text = None
+
+
+class Item(_ItemText, frozen=True):
+    """Item do estoque, com posição e quantidade já convertidas para int."""
+
+    x: int = -1
+    y: int = -1
+    qty: int = 0
+
+
+class _ItemRecord(_ItemText, frozen=True):
+    """Item como está no JSON; UNSET marca campo ausente."""
+
+    x: Number = msgspec.UNSET
+    y: Number = msgspec.UNSET
+    qty: Number = msgspec.UNSET
+
+
+class InventoryFile(msgspec.Struct):
+    """Formato de data/inventory.json (itens mantidos como JSON bruto)."""
+
+    map: Dict[str, Any] = msgspec.field(default_factory=lambda: {"width": 10, "height": 6})
+    aisles: List[Any] = []
+    zones: List[Dict[str, Any]] = []
+    items: List[msgspec.Raw] = []
+
+
+_INVENTORY_DECODER = msgspec.json.Decoder(InventoryFile)
+_ITEM_DECODER = msgspec.json.Decoder(_ItemRecord)
+_JSON_ENCODER = msgspec.json.Encoder()
+
+
+def _as_int(value: Number, default: int) -> int:
+    # mesma conversão de antes: int(item.get(campo, padrão))
+    return default if value is msgspec.UNSET else int(value)  # type: ignore[arg-type]
+
+
+def decode_items(
+    raw_items: List[msgspec.Raw],
+) -> Tuple[Tuple[Item, ...], Tuple[bytes, ...], Tuple[Tuple[int, int], ...], Tuple[str, ...]]:
+    """Decodifica cada item para `Item`, guardando também o JSON original dele.
+
+    As respostas da API usam os bytes originais (com todos os campos do
+    arquivo). Também devolve a posição do marcador no SVG, onde x/y ausentes
+    valem 0 (coluna/linha 0), e não -1 como nos filtros. Um item que nem int()
+    consegue converter é ignorado, e o problema volta na lista de erros,
+    exibida na página e nos cabeçalhos da API.
+    """
+    items: List[Item] = []
+    raws: List[bytes] = []
+    svg_pos: List[Tuple[int, int]] = []
+    errors: List[str] = []
+    for pos, raw in enumerate(raw_items):
+        try:
+            rec = _ITEM_DECODER.decode(raw)
+            item = Item(
+                sku=rec.sku,
+                name=rec.name,
+                category=rec.category,
+                description=rec.description,
+                aisle=rec.aisle,
+                x=_as_int(rec.x, -1),
+                y=_as_int(rec.y, -1),
+                qty=_as_int(rec.qty, 0),
+            )
+        except (msgspec.ValidationError, TypeError, ValueError) as exc:
+            errors.append(f"item {pos} ignorado: {exc}")
+            log.warning("item %d de %s ignorado: %s", pos, DATA_FILE.name, exc)
+            continue
+        items.append(item)
+        raws.append(bytes(raw))
+        svg_pos.append((_as_int(rec.x, 0), _as_int(rec.y, 0)))
+    return tuple(items), tuple(raws), tuple(svg_pos), tuple(errors)
+
+
+def _json_array(raws: Sequence[bytes]) -> bytes:
+    return b"[" + b",".join(raws) + b"]"
+
+
+def normalize_inventory(inventory: Dict[str, Any]) -> Dict[str, Any]:
+    """Converte os campos do mapa/zonas uma única vez (itens já vêm tipados)."""
+    map_cfg = inventory.setdefault("map", {"width": 10, "height": 6})
+    map_cfg["width"] = int(map_cfg.get("width", 10))
+    map_cfg["height"] = int(map_cfg.get("height", 6))
+    for z in inventory.setdefault("zones", []):
+        z["x"], z["y"] = int(z.get("x", 0)), int(z.get("y", 0))
+        z["w"], z["h"] = int(z.get("w", 1)), int(z.get("h", 1))
+        if "label" in z:
+            z["label"] = str(z["label"])
+    # tupla imutável: as threads do Flask compartilham as mesmas referências
+    inventory["items"] = tuple(inventory.get("items", []))
+    return inventory
+
+
+def _zone_label_at(zones: List[Dict[str, Any]], x: int, y: int) -> str:
+    for z in zones:
+        if z["x"] <= x < z["x"] + z["w"] and z["y"] <= y < z["y"] + z["h"]:
+            return z.get("label", "Corredor")
+    return "Corredor"
+
+
+def build_aisle_grid(inventory: Dict[str, Any]) -> Dict[str, Any]:
+    """Tabela grid[y][x] -> rótulo da zona e corredor já resolvido de cada item."""
+    width, height = inventory["map"]["width"], inventory["map"]["height"]
+    grid: List[List[str | None]] = [[None] * width for _ in range(height)]
+    # em zonas sobrepostas vale a primeira da lista, como na busca linear
+    for z in reversed(inventory["zones"]):
+        label = z.get("label", "Corredor")
+        for y in range(max(0, z["y"]), min(height, z["y"] + z["h"])):
+            row = grid[y]
+            for x in range(max(0, z["x"]), min(width, z["x"] + z["w"])):
+                row[x] = label
+    inventory["_aisle_grid"] = grid
+
+    # Corredor de cada item: usa item.aisle se existir; caso contrário,
+    # a zona que cobre (x, y). Lista paralela a items, para não alterá-los.
+    item_aisles: List[str] = []
+    for it in inventory["items"]:
+        x, y = it.x, it.y
+        if it.aisle:
+            item_aisles.append(str(it.aisle))
+        elif 0 <= x < width and 0 <= y < height:
+            label = grid[y][x]
+            item_aisles.append(label if label is not None else "Corredor")
+        else:
+            # fora do mapa a tabela não cobre: busca linear nas zonas (caso raro)
+            item_aisles.append(_zone_label_at(inventory["zones"], x, y))
+    inventory["_item_aisles"] = tuple(item_aisles)
+    return inventory
+
+
+def build_filter_index(inventory: Dict[str, Any]) -> Dict[str, Any]:
+    """Índices coluna -> ids e categoria -> ids, e as categorias para os filtros da página."""
+    by_col: Dict[int, Set[int]] = {}
+    by_category: Dict[str, Set[int]] = {}
+    for idx, item in enumerate(inventory["items"]):
+        by_col.setdefault(item.x, set()).add(idx)
+        by_category.setdefault(str(item.category).strip(), set()).add(idx)
+    inventory["_ids_by_col"] = {col: frozenset(ids) for col, ids in by_col.items()}
+    inventory["_ids_by_category"] = {cat: frozenset(ids) for cat, ids in by_category.items()}
+    # Lista de categorias únicas (ordenadas), compartilhada entre requisições
+    inventory["_categories"] = tuple(
+        sorted({str(item.category).strip() for item in inventory["items"] if item.category})
+    )
+    return inventory
+
+
+def svg_layout(inventory: Dict[str, Any], cell_px: int) -> Dict[str, Any]:
+    """Tamanho do SVG e retângulos das zonas para um `cell_px` (memorizado por inventário)."""
+    cache: Dict[int, Dict[str, Any]] = inventory["_svg_layout"]
+    layout = cache.get(cell_px)
+    if layout is not None:
+        return layout
+
+    width, height = inventory["map"]["width"], inventory["map"]["height"]
+    spacing, margin = SVG_SPACING, SVG_MARGIN
+
+    def cell_to_px(coord: int) -> int:
+        return margin + coord * (cell_px + spacing)
+
+    svg_zones: List[Dict[str, Any]] = []
+    for z in inventory["zones"]:
+        zx, zy, zw, zh = z["x"], z["y"], z["w"], z["h"]
+        px_w = zw * cell_px + (zw - 1) * spacing
+        px_h = zh * cell_px + (zh - 1) * spacing
+        base_fs = max(10, min(18, cell_px // 3 + 6))
+        # estimativa de caracteres que cabem na largura do retângulo
+        max_chars = max(4, int((px_w - 24) / (base_fs * 0.6)))
+        raw_label = z.get("label", "")
+        label_display = raw_label if len(raw_label) <= max_chars else raw_label[: max(0, max_chars - 1) ] + "…"
+        svg_zones.append(
+            {
+                "x": cell_to_px(zx),
+                "y": cell_to_px(zy),
+                "w": px_w,
+                "h": px_h,
+                "label": raw_label,
+                "label_display": label_display,
+                "fs": base_fs,
+                "emoji": z.get("emoji", ""),
+                "fill": z.get("fill", "#cbd5e1"),
+                "col": zx,
+            }
+        )
+
+    layout = {
+        "svg_width": margin * 2 + width * cell_px + (width - 1) * spacing,
+        "svg_height": margin * 2 + height * cell_px + (height - 1) * spacing,
+        "svg_zones": tuple(svg_zones),
+    }
+    cache[cell_px] = layout
+    return layout
+
+
+def build_search_index(inventory: Dict[str, Any]) -> Dict[str, Any]:
+    """Pré-calcula o texto de busca de cada item e o índice invertido token -> ids."""
+    haystacks: List[str] = []
+    token_index: Dict[str, Set[int]] = {}
+    for idx, item in enumerate(inventory["items"]):
+        haystack = " ".join(
+            [str(item.name), str(item.category), str(item.sku), str(item.description)]
+        ).lower()
+        haystacks.append(haystack)
+        for token in _TOKEN_SPLIT.split(haystack):
+            if token:
+                token_index.setdefault(token, set()).add(idx)
+    inventory["_haystacks"] = haystacks
+    inventory["_token_index"] = token_index
+    inventory["_vocab"] = list(token_index)
+    inventory["_vocab_scan"] = _join_for_scan(inventory["_vocab"])
+    inventory["_postings_cache"] = OrderedDict()
+    inventory["_postings_lock"] = threading.Lock()
+    return inventory
+
+
+def _join_for_scan(texts: List[str]) -> Tuple[str, List[int]]:
+    """Concatena os textos com um separador raro, guardando o início de cada um."""
+    starts: List[int] = []
+    pos = 0
+    for text in texts:
+        starts.append(pos)
+        pos += len(text) + len(_SCAN_SEP)
+    return _SCAN_SEP.join(texts), starts
+
+
+def _scan_joined(joined: Tuple[str, List[int]], needle: str) -> Iterator[int]:
+    """Índices dos textos que contêm `needle`, numa única varredura do buffer.
+
+    `str.find` percorre o buffer inteiro em C; a cada ocorrência o texto dono
+    é achado por busca binária nos inícios e a varredura pula para o próximo.
+    """
+    buf, starts = joined
+    pos = buf.find(needle)
+    while pos != -1:
+        idx = bisect_right(starts, pos) - 1
+        yield idx
+        if idx + 1 >= len(starts):
+            break
+        pos = buf.find(needle, starts[idx + 1])
+
+
+def _word_postings(inventory: Dict[str, Any], word: str) -> FrozenSet[int] | None:
+    """Ids dos itens com algum token que contém `word` (memorizado por inventário).
+
+    Devolve None quando a palavra é comum demais: unir as listas custaria
+    mais que conferir o texto de cada item.
+    """
+    cache: OrderedDict[str, FrozenSet[int] | None] = inventory["_postings_cache"]
+    lock: threading.Lock = inventory["_postings_lock"]
+    with lock:
+        if word in cache:
+            cache.move_to_end(word)
+            return cache[word]
+
+    token_index: Dict[str, Set[int]] = inventory["_token_index"]
+    vocab: List[str] = inventory["_vocab"]
+    limit = len(inventory["_haystacks"]) // _BROAD_WORD_FRACTION
+    matched: List[Set[int]] = []
+    total = 0
+    ids: FrozenSet[int] | None = None
+    for t in _scan_joined(inventory["_vocab_scan"], word):
+        postings = token_index[vocab[t]]
+        total += len(postings)
+        if total > limit:
+            break
+        matched.append(postings)
+    else:
+        ids = frozenset().union(*matched)
+
+    # LRU: descarta só as entradas usadas há mais tempo
+    with lock:
+        cache[word] = ids
+        cache.move_to_end(word)
+        while len(cache) > _POSTINGS_CACHE_SIZE:
+            cache.popitem(last=False)
+    return ids
+
+
+def search_item_ids(inventory: Dict[str, Any], query: str) -> AbstractSet[int]:
+    """Ids dos itens cujo texto de busca contém `query` (já em minúsculas)."""
+    haystacks: List[str] = inventory["_haystacks"]
+    words = _WORD.findall(query)
+    if not words:
+        # sem palavras (ex.: "-"): o trecho costuma ser comum, e o `in` por item
+        # é mais barato que uma volta do laço find/bisect por ocorrência
+        return {idx for idx, hs in enumerate(haystacks) if query in hs}
+    # cada palavra da busca cai dentro de um único token do item, então só
+    # precisam ser conferidos os itens presentes em todas as listas de postagem
+    postings = [p for p in (_word_postings(inventory, w) for w in set(words)) if p is not None]
+    if not postings:
+        # só palavras comuns: a varredura dos textos é o caminho mais barato
+        return {idx for idx, hs in enumerate(haystacks) if query in hs}
+    postings.sort(key=len)
+    candidates = postings[0].intersection(*postings[1:])
+    if len(words) == 1 and words[0] == query:
+        return candidates
+    return {idx for idx in candidates if query in haystacks[idx]}
+
+
+def _prepare_inventory(data: Dict[str, Any], etag: str) -> Dict[str, Any]:
+    data.setdefault("_errors", ())
+    data = build_aisle_grid(normalize_inventory(data))
+    data = build_search_index(build_filter_index(data))
+    data["_svg_layout"] = {}
+    # Respostas de /api/map e /api/items já serializadas, com ETag pelo mtime
+    data["_etag"] = etag
+    data["_json_map"] = _JSON_ENCODER.encode(data["map"])
+    data["_json_items"] = _json_array(data["_raw_items"])
+    return data
+
+
+def _empty_inventory(etag: str) -> Dict[str, Any]:
+    return _prepare_inventory({"map": {"width": 10, "height": 6}, "items": (), "_raw_items": (), "_item_svg_pos": ()}, etag)
 
 
 def load_inventory() -> Dict[str, Any]:
-    if not DATA_FILE.exists():
-        return {"map": {"width": 10, "height": 6}, "items": []}
-    with DATA_FILE.open("r", encoding="utf-8") as f:
-        return json.load(f)
+    try:
+        mtime = DATA_FILE.stat().st_mtime_ns
+    except FileNotFoundError:
+        return _empty_inventory("empty")
+    with _CACHE_LOCK:
+        if _CACHE["mtime"] == mtime:
+            return _CACHE["data"]
+        try:
+            parsed = _INVENTORY_DECODER.decode(DATA_FILE.read_bytes())
+            data = msgspec.structs.asdict(parsed)
+            (
+                data["items"],
+                data["_raw_items"],
+                data["_item_svg_pos"],
+                data["_errors"],
+            ) = decode_items(parsed.items)
+            data = _prepare_inventory(data, format(mtime, "x"))
+        except (msgspec.DecodeError, TypeError, ValueError) as exc:
+            # JSON inválido: mantém a última versão boa (ou um inventário vazio),
+            # mas avisa na página e na API que os dados estão desatualizados
+            log.error("não foi possível carregar %s: %s", DATA_FILE, exc)
+            previous = _CACHE["data"] or _empty_inventory(format(mtime, "x"))
+            data = {
+                **previous,
+                "_errors": (f"{DATA_FILE.name} inválido, exibindo a última versão carregada: {exc}",),
+            }
+        _CACHE["mtime"] = mtime
+        _CACHE["data"] = data
+        return data
 
 
 def create_app() -> Flask:
     app = Flask(__name__, template_folder="templates", static_folder="static")
+    app.jinja_env.globals["zip"] = zip
+    # Templates compilados ficam em disco e são reaproveitados entre processos;
+    # auto_reload segue o modo debug (TEMPLATES_AUTO_RELOAD do Flask)
+    try:
+        JINJA_CACHE_DIR.mkdir(exist_ok=True)
+        # testa a escrita: em diretório somente leitura o Jinja falharia a cada dump
+        with tempfile.TemporaryFile(dir=JINJA_CACHE_DIR):
+            pass
+    except OSError as exc:
+        log.warning("cache de templates desativado (%s): %s", JINJA_CACHE_DIR, exc)
+    else:
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(str(JINJA_CACHE_DIR))
+    app.jinja_env.get_template("index.html")  # compila já na inicialização
 
     inventory: Dict[str, Any] = load_inventory()
 
     @app.get("/")
     def index():
-        # Recarrega inventário a cada requisição para refletir mudanças no JSON
+        # Recarrega o inventário se o JSON mudou (cache por mtime)
         inventory: Dict[str, Any] = load_inventory()
         # Logo opcional em static/logo.png
         static_logo = BASE_DIR / "static" / "logo.png"
@@ -45,120 +444,54 @@ def create_app() -> Flask:
         except ValueError:
             selected_col = None
 
-        map_cfg: Dict[str, Any] = inventory.get("map", {"width": 10, "height": 6})
-        all_items: List[Dict[str, Any]] = inventory.get("items", [])
-        zones: List[Dict[str, Any]] = inventory.get("zones", [])
+        map_cfg: Dict[str, Any] = inventory["map"]
+        all_items: Tuple[Item, ...] = inventory["items"]
         aisles: List[str] = inventory.get("aisles", [])
 
-        # Lista de categorias únicas (ordenadas)
-        categories = sorted({str(it.get("category", "")).strip() for it in all_items if it.get("category")})
-
-        def matches(item: Dict[str, Any]) -> bool:
-            if active_category and str(item.get("category", "")).strip() != active_category:
-                return False
-            if not query:
-                return True
-            haystack = " ".join(
-                [
-                    str(item.get("name", "")),
-                    str(item.get("category", "")),
-                    str(item.get("sku", "")),
-                    str(item.get("description", "")),
-                ]
-            ).lower()
-            return query in haystack
-
-        filtered_items = [it for it in all_items if matches(it)]
-        if selected_col is not None:
-            filtered_items = [it for it in filtered_items if int(it.get("x", -1)) == selected_col]
-
-        # Descobrir o corredor de um item: usa item["aisle"] se existir;
-        # caso contrário, tenta inferir pela zona (se x,y estiverem dentro de uma zona)
-        def infer_aisle(it: Dict[str, Any]) -> str:
-            if it.get("aisle"):
-                return str(it.get("aisle"))
-            ix = int(it.get("x", -1))
-            iy = int(it.get("y", -1))
-            for z in zones:
-                zx, zy = int(z.get("x", 0)), int(z.get("y", 0))
-                zw, zh = int(z.get("w", 1)), int(z.get("h", 1))
-                if zx <= ix < zx + zw and zy <= iy < zy + zh:
-                    return str(z.get("label", "Corredor"))
-            return "Corredor"
-
-        for it in filtered_items:
-            it["aisle_display"] = infer_aisle(it)
-
-        # Mapa de células -> itens (para facilitar o template Jinja)
-        width = int(map_cfg.get("width", 10))
-        height = int(map_cfg.get("height", 6))
-        cells: List[List[List[Dict[str, Any]]]] = [
-            [ [] for _ in range(width) ] for _ in range(height)
-        ]
-        for it in all_items:
-            x = int(it.get("x", -1))
-            y = int(it.get("y", -1))
-            if 0 <= x < width and 0 <= y < height:
-                cells[y][x].append(it)
-
-        # Layout SVG (tamanho em pixels e elementos prontos)
-        spacing = 8  # espaço entre células
-        margin = 16
-        svg_width = margin * 2 + width * cell_px + (width - 1) * spacing
-        svg_height = margin * 2 + height * cell_px + (height - 1) * spacing
-
-        def cell_to_px(coord: int) -> int:
-            return margin + coord * (cell_px + spacing)
-
-        svg_zones: List[Dict[str, Any]] = []
-        for z in zones:
-            zx = int(z.get("x", 0))
-            zy = int(z.get("y", 0))
-            zw = int(z.get("w", 1))
-            zh = int(z.get("h", 1))
-            px_w = zw * cell_px + (zw - 1) * spacing
-            px_h = zh * cell_px + (zh - 1) * spacing
-            base_fs = max(10, min(18, cell_px // 3 + 6))
-            # estimativa de caracteres que cabem na largura do retângulo
-            max_chars = max(4, int((px_w - 24) / (base_fs * 0.6)))
-            raw_label = str(z.get("label", ""))
-            label_display = raw_label if len(raw_label) <= max_chars else raw_label[: max(0, max_chars - 1) ] + "…"
-            svg_zones.append(
-                {
-                    "x": cell_to_px(zx),
-                    "y": cell_to_px(zy),
-                    "w": px_w,
-                    "h": px_h,
-                    "label": raw_label,
-                    "label_display": label_display,
-                    "fs": base_fs,
-                    "emoji": z.get("emoji", ""),
-                    "fill": z.get("fill", "#cbd5e1"),
-                    "col": zx,
-                }
-            )
+        categories: Tuple[str, ...] = inventory["_categories"]
 
-        def qty_color(qty: int) -> str:
-            if qty <= 10:
-                return "#ef4444"  # vermelho
-            if qty <= 30:
-                return "#f59e0b"  # amarelo
-            return "#22c55e"      # verde
+        # Cada filtro ativo vira um conjunto de ids; o resultado é a interseção
+        selections: List[AbstractSet[int]] = []
+        if query:
+            selections.append(search_item_ids(inventory, query))
+        if active_category:
+            selections.append(inventory["_ids_by_category"].get(active_category, frozenset()))
+        if selected_col is not None:
+            selections.append(inventory["_ids_by_col"].get(selected_col, frozenset()))
+        item_aisles: Tuple[str, ...] = inventory["_item_aisles"]
+        item_svg_pos: Tuple[Tuple[int, int], ...] = inventory["_item_svg_pos"]
+        if selections:
+            selections.sort(key=len)
+            ids = sorted(set(selections[0]).intersection(*selections[1:]))
+            filtered_items = [all_items[idx] for idx in ids]
+            # corredores e posições no SVG já resolvidos no carregamento (listas paralelas a items)
+            aisle_display: Sequence[str] = [item_aisles[idx] for idx in ids]
+            svg_pos: Sequence[Tuple[int, int]] = [item_svg_pos[idx] for idx in ids]
+        else:
+            filtered_items = list(all_items)
+            aisle_display = item_aisles
+            svg_pos = item_svg_pos
+
+        # Partes do SVG que não dependem dos filtros (memorizadas por inventário e cell_px)
+        layout = svg_layout(inventory, cell_px)
+
+        # centro da célula = origem + coord * passo (constantes fora do laço)
+        stride = cell_px + SVG_SPACING
+        center = SVG_MARGIN + cell_px // 2
+        radius = max(8, min(14, cell_px // 3))
+        last_color = len(QTY_COLOR) - 1
 
         svg_items: List[Dict[str, Any]] = []
-        for it in filtered_items:
-            gx = int(it.get("x", 0))
-            gy = int(it.get("y", 0))
-            cx = cell_to_px(gx) + cell_px // 2
-            cy = cell_to_px(gy) + cell_px // 2
+        for it, (gx, gy) in zip(filtered_items, svg_pos):
+            qty = it.qty
             svg_items.append(
                 {
-                    "cx": cx,
-                    "cy": cy,
-                    "r": max(8, min(14, cell_px // 3)),
-                    "qty": int(it.get("qty", 0)),
-                    "fill": qty_color(int(it.get("qty", 0))),
-                    "label": it.get("name", ""),
+                    "cx": center + gx * stride,
+                    "cy": center + gy * stride,
+                    "r": radius,
+                    "qty": qty,
+                    "fill": QTY_COLOR[min(max(qty, 0), last_color)],
+                    "label": it.name,
                     "gx": gx,
                     "gy": gy,
                 }
@@ -166,55 +499,65 @@ def create_app() -> Flask:
 
         # não usamos mais svg_cols; os próprios retângulos das zonas serão clicáveis
 
-        return render_template(
+        # Envia o HTML em partes à medida que o Jinja renderiza (stream_template
+        # já mantém o contexto da requisição durante o streaming)
+        return stream_template(
             "index.html",
             query=query,
             map_cfg=map_cfg,
-            cells=cells,
             items=filtered_items,
+            aisle_display=aisle_display,
             categories=categories,
             active_category=active_category,
             view_mode=view_mode,
             cell_px=cell_px,
-            svg_width=svg_width,
-            svg_height=svg_height,
-            svg_zones=svg_zones,
+            svg_width=layout["svg_width"],
+            svg_height=layout["svg_height"],
+            svg_zones=layout["svg_zones"],
             svg_items=svg_items,
             aisles=aisles,
             selected_col=selected_col,
             logo_url=logo_url,
+            load_errors=inventory["_errors"],
         )
 
+    def json_with_etag(inv: Dict[str, Any], etag: str, body: Callable[[], bytes]) -> Response:
+        # Cliente já tem esta versão (If-None-Match, comparação fraca da RFC 7232,
+        # pois proxies com gzip enfraquecem o ETag): responde 304 sem corpo
+        if request.if_none_match.contains_weak(etag):
+            resp = app.response_class(status=304)
+        else:
+            resp = app.response_class(body(), mimetype="application/json")
+        resp.set_etag(etag)
+        errors: Tuple[str, ...] = inv["_errors"]
+        if errors:
+            # dados incompletos ou desatualizados: não esconder atrás de um 200 limpo
+            resp.headers["Warning"] = f'199 - "inventory has {len(errors)} load problem(s); see server log"'
+        return resp
+
     @app.get("/api/map")
     def api_map():
         inv = load_inventory()
-        return jsonify(inv.get("map", {"width": 10, "height": 6}))
+        return json_with_etag(inv, inv["_etag"], lambda: inv["_json_map"])
 
     @app.get("/api/items")
     def api_items():
         inv = load_inventory()
-        return jsonify(inv.get("items", []))
+        return json_with_etag(inv, inv["_etag"], lambda: inv["_json_items"])
 
     @app.get("/api/search")
     def api_search():
         inv = load_inventory()
         query: str = request.args.get("q", "").strip().lower()
-        items: List[Dict[str, Any]] = inv.get("items", [])
         if not query:
-            return jsonify(items)
-
-        def matches(item: Dict[str, Any]) -> bool:
-            haystack = " ".join(
-                [
-                    str(item.get("name", "")),
-                    str(item.get("category", "")),
-                    str(item.get("sku", "")),
-                    str(item.get("description", "")),
-                ]
-            ).lower()
-            return query in haystack
-
-        return jsonify([it for it in items if matches(it)])
+            return json_with_etag(inv, inv["_etag"], lambda: inv["_json_items"])
+        etag = inv["_etag"] + "-" + hashlib.blake2b(query.encode("utf-8"), digest_size=8).hexdigest()
+        raws: Tuple[bytes, ...] = inv["_raw_items"]
+        return json_with_etag(
+            inv,
+            etag,
+            lambda: _json_array([raws[idx] for idx in sorted(search_item_ids(inv, query))]),
+        )
 
     return app
 